@@ -1,9 +1,17 @@
 import multiprocessing
 import os
 
+from uvicorn.workers import UvicornWorker
+
+
+class UvloopWorker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
-workers = max(2, multiprocessing.cpu_count() * 2)
-worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count())))
+worker_class = UvloopWorker
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
 keepalive = 5
 timeout = 60
 accesslog = "-"
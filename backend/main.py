@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import io
 import logging
+import multiprocessing
 import os
 import shutil
 import subprocess
@@ -10,15 +11,23 @@ import tempfile
 import time
 import uuid
 import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Set
 from urllib.parse import urlparse
 
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from starlette.middleware.gzip import GZipMiddleware
 from starlette.requests import Request
 from pydantic import BaseModel
+import orjson
 import tiktoken
 
 SKIP_DIRS = {
@@ -46,12 +55,40 @@ ALLOWED_GIT_HOSTS = {
     if host.strip()
 }
 MAX_ZIP_BYTES = int(os.getenv('MAX_ZIP_BYTES', str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024
 MAX_EXTRACT_BYTES = int(os.getenv('MAX_EXTRACT_BYTES', str(200 * 1024 * 1024)))
+ZIP_CHUNK_BYTES = 1024 * 1024
 MAX_FILE_BYTES = int(os.getenv('MAX_FILE_BYTES', str(512_000)))
+BINARY_SAMPLE_BYTES = 1024
+TEXT_BYTES = bytes(sorted(set(range(32, 127)) | {9, 10, 13}))
 MAX_TOKEN_TEXT_CHARS = int(os.getenv('MAX_TOKEN_TEXT_CHARS', str(2_000_000)))
+TOKEN_CHUNK_CHARS = 64 * 1024
 GIT_CLONE_TIMEOUT_SECONDS = int(os.getenv('GIT_CLONE_TIMEOUT_SECONDS', '60'))
+PARSE_CACHE_BYTES = int(os.getenv('PARSE_CACHE_BYTES', str(128 * 1024 * 1024)))
+PARSE_CACHE_ENTRY_BYTES = int(os.getenv('PARSE_CACHE_ENTRY_BYTES', str(8 * 1024 * 1024)))
+READ_CONCURRENCY = int(os.getenv('READ_CONCURRENCY', '64'))
 
-app = FastAPI(title='Codex Repo Unroller')
+CPU_POOL_WORKERS = int(os.getenv('CPU_POOL_WORKERS', '1'))
+TOKENIZER_THREADS = int(os.getenv('TOKENIZER_THREADS', str(os.cpu_count() or 1)))
+
+
+def create_cpu_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=CPU_POOL_WORKERS,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.cpu_pool = create_cpu_pool()
+    try:
+        yield
+    finally:
+        app.state.cpu_pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(title='Codex Repo Unroller', lifespan=lifespan)
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger('codex.repo_unroller')
 
@@ -74,6 +111,9 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 @app.middleware('http')
 async def request_logging(request: Request, call_next):
+    if request.url.path == '/healthz':
+        return await call_next(request)
+
     start = time.perf_counter()
     request_id = request.headers.get('x-request-id') or uuid.uuid4().hex
     request.state.request_id = request_id
@@ -82,7 +122,7 @@ async def request_logging(request: Request, call_next):
     except Exception:
         duration_ms = round((time.perf_counter() - start) * 1000, 2)
         logger.exception(
-            json.dumps(
+            orjson.dumps(
                 {
                     'event': 'request_error',
                     'request_id': request_id,
@@ -91,13 +131,13 @@ async def request_logging(request: Request, call_next):
                     'duration_ms': duration_ms,
                     'client': request.client.host if request.client else None
                 }
-            )
+            ).decode()
         )
         raise
 
     duration_ms = round((time.perf_counter() - start) * 1000, 2)
     logger.info(
-        json.dumps(
+        orjson.dumps(
             {
                 'event': 'request_complete',
                 'request_id': request_id,
@@ -107,29 +147,23 @@ async def request_logging(request: Request, call_next):
                 'duration_ms': duration_ms,
                 'client': request.client.host if request.client else None
             }
-        )
+        ).decode()
     )
     response.headers['X-Request-ID'] = request_id
     return response
 
 
-def is_binary_file(path: Path, sample_size: int = 1024) -> bool:
-    try:
-        with path.open('rb') as reader:
-            chunk = reader.read(sample_size)
-            if not chunk:
-                return False
-            if b'\x00' in chunk:
-                return True
-            text_chars = set(range(32, 127)) | {9, 10, 13}
-            non_text = sum(1 for byte in chunk if byte not in text_chars)
-            return (non_text / len(chunk)) > 0.3
-    except (UnicodeDecodeError, OSError):
+def is_binary_chunk(chunk: bytes) -> bool:
+    if not chunk:
+        return False
+    if b'\x00' in chunk:
         return True
+    non_text = len(chunk.translate(None, TEXT_BYTES))
+    return (non_text / len(chunk)) > 0.3
 
 
-def contains_skipped_segment(path: Path) -> bool:
-    return any(part in SKIP_DIRS for part in path.parts)
+def contains_skipped_segment(path: str) -> bool:
+    return any(part in SKIP_DIRS for part in path.split('/'))
 
 
 def normalize_repo_url(repo_url: str) -> str:
@@ -154,110 +188,127 @@ def normalize_repo_url(repo_url: str) -> str:
     return f'https://{host}/{owner}/{repo}.git'
 
 
-def clone_repository(repo_url: str, dest: Path) -> None:
+def git_env() -> Dict[str, str]:
     env = os.environ.copy()
     env['GIT_TERMINAL_PROMPT'] = '0'
     env['GIT_ASKPASS'] = 'echo'
     env['GIT_SSH_COMMAND'] = 'ssh -oBatchMode=yes'
+    return env
+
+
+def resolve_remote_head(repo_url: str) -> str | None:
+    process = subprocess.run(
+        ['git', 'ls-remote', repo_url, 'HEAD'],
+        capture_output=True,
+        text=True,
+        check=False,
+        timeout=GIT_CLONE_TIMEOUT_SECONDS,
+        env=git_env()
+    )
+    if process.returncode != 0:
+        raise ValueError(process.stderr.strip() or 'Git ls-remote failed')
+    fields = process.stdout.split()
+    return fields[0] if fields else None
+
+
+def clone_repository(repo_url: str, dest: Path, git_dir: Path) -> str | None:
     process = subprocess.run(
-        ['git', 'clone', '--depth', '1', repo_url, str(dest)],
+        [
+            'git',
+            'clone',
+            '--depth',
+            '1',
+            '--no-tags',
+            '--separate-git-dir',
+            str(git_dir),
+            repo_url,
+            str(dest)
+        ],
         capture_output=True,
         text=True,
         check=False,
         timeout=GIT_CLONE_TIMEOUT_SECONDS,
-        env=env
+        env=git_env()
     )
     if process.returncode != 0:
         raise ValueError(process.stderr.strip() or 'Git clone failed')
-    shutil.rmtree(dest / '.git', ignore_errors=True)
+    (dest / '.git').unlink(missing_ok=True)
+    head = subprocess.run(
+        ['git', '--git-dir', str(git_dir), 'rev-parse', '--verify', '--quiet', 'HEAD'],
+        capture_output=True,
+        text=True,
+        check=False,
+        timeout=GIT_CLONE_TIMEOUT_SECONDS,
+        env=git_env()
+    )
+    return head.stdout.strip() or None
+
+
+class ParseCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> bytes | None:
+        body = self.entries.get(key)
+        if body is not None:
+            self.entries.move_to_end(key)
+        return body
+
+    def put(self, key: tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self.entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+parse_cache = ParseCache(PARSE_CACHE_BYTES)
 
 
 def is_symlink(info: zipfile.ZipInfo) -> bool:
     return (info.external_attr >> 16) & 0o170000 == 0o120000
 
 
+def normalize_member_path(filename: str) -> str:
+    if '\\' in filename or filename.startswith('/') or os.path.isabs(filename):
+        raise ValueError('Zip contains invalid paths')
+    normalized = os.path.normpath(filename)
+    if any(part == '..' for part in normalized.split('/')):
+        raise ValueError('Zip contains invalid paths')
+    return normalized
+
+
 def safe_extract_zip(source_file: Path, destination: Path, max_total_bytes: int) -> None:
     with zipfile.ZipFile(source_file) as archive:
-        root = destination.resolve()
         total_size = 0
         for member in archive.infolist():
+            member_path = normalize_member_path(member.filename)
             if is_symlink(member):
                 raise ValueError('Zip contains symlinks')
-            target = destination / member.filename
-            if not str(target.resolve()).startswith(str(root)):
-                raise ValueError('Zip contains invalid paths')
-            if member.file_size < 0:
-                raise ValueError('Zip contains invalid file size')
-            total_size += member.file_size
-            if total_size > max_total_bytes:
-                raise ValueError('Zip exceeds allowed total size')
-        archive.extractall(destination)
-
-
-def recursively_collect(root: Path, rel_path: Path) -> tuple[List[Dict], List[Dict]]:
-    tree_nodes: List[Dict] = []
-    file_records: List[Dict] = []
-
-    for entry in sorted(root.iterdir(), key=lambda p: p.name.lower()):
-        if contains_skipped_segment(rel_path / entry.name):
-            continue
-
-        if entry.is_symlink():
-            continue
-
-        node_path = (rel_path / entry.name).as_posix().lstrip('./')
-        if entry.is_dir():
-            children_tree, children_files = recursively_collect(entry, rel_path / entry.name)
-            tree_nodes.append(
-                {
-                    'name': entry.name,
-                    'path': node_path,
-                    'type': 'directory',
-                    'children': children_tree
-                }
-            )
-            file_records.extend(children_files)
-        elif entry.is_file():
-            size = entry.stat().st_size
-            if is_binary_file(entry):
-                file_records.append(
-                    {
-                        'path': node_path,
-                        'size': size,
-                        'omitted': True,
-                        'omittedReason': 'binary'
-                    }
-                )
-                tree_nodes.append({'name': entry.name, 'path': node_path, 'type': 'file'})
+            if contains_skipped_segment(member_path):
                 continue
-            if size > MAX_FILE_BYTES:
-                file_records.append(
-                    {
-                        'path': node_path,
-                        'size': size,
-                        'omitted': True,
-                        'omittedReason': 'large'
-                    }
-                )
-                tree_nodes.append({'name': entry.name, 'path': node_path, 'type': 'file'})
+            target = destination / member_path
+            if member.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
                 continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with archive.open(member) as reader, target.open('wb') as writer:
+                while chunk := reader.read(ZIP_CHUNK_BYTES):
+                    total_size += len(chunk)
+                    if total_size > max_total_bytes:
+                        raise ValueError('Zip exceeds allowed total size')
+                    writer.write(chunk)
 
-            content = entry.read_text(encoding='utf-8', errors='replace')
-            file_records.append(
-                {
-                    'path': node_path,
-                    'size': size,
-                    'omitted': False,
-                    'omittedReason': None,
-                    'content': content
-                }
-            )
-            tree_nodes.append({'name': entry.name, 'path': node_path, 'type': 'file'})
-
-    return tree_nodes, file_records
 
-
-class ParsedFile(BaseModel):
+@dataclass(slots=True)
+class FileRecord:
     path: str
     size: int
     omitted: bool
@@ -265,9 +316,111 @@ class ParsedFile(BaseModel):
     content: str | None = None
 
 
-class ParsedResponse(BaseModel):
-    files: List[ParsedFile]
-    tree: List[Dict]
+def read_file_record(path: str, node_path: str, size: int, max_bytes: int = MAX_FILE_BYTES) -> FileRecord:
+    try:
+        with open(path, 'rb') as reader:
+            data = reader.read(max_bytes + 1 if size <= max_bytes else BINARY_SAMPLE_BYTES)
+    except OSError:
+        return FileRecord(node_path, size, omitted=True, omittedReason='binary')
+    if is_binary_chunk(data[:BINARY_SAMPLE_BYTES]):
+        return FileRecord(node_path, size, omitted=True, omittedReason='binary')
+    if size > max_bytes or len(data) > max_bytes:
+        return FileRecord(node_path, size, omitted=True, omittedReason='large')
+    content = data.decode('utf-8', errors='replace')
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return FileRecord(node_path, size, omitted=False, content=content)
+
+
+read_executor = ThreadPoolExecutor(max_workers=READ_CONCURRENCY, thread_name_prefix='read')
+
+
+def scan_sorted(directory: str) -> List[os.DirEntry]:
+    with os.scandir(directory) as iterator:
+        return sorted(iterator, key=lambda entry: entry.name.lower())
+
+
+def collect_tree(root: str, pending: List[tuple[str, str, int]]) -> List[Dict]:
+    tree_nodes: List[Dict] = []
+    stack: List[tuple[Iterator[os.DirEntry], str, List[Dict]]] = [
+        (iter(scan_sorted(root)), '', tree_nodes)
+    ]
+
+    while stack:
+        entries, prefix, children = stack[-1]
+        for entry in entries:
+            if entry.name in SKIP_DIRS:
+                continue
+
+            if entry.is_symlink():
+                continue
+
+            node_path = prefix + entry.name
+
+            if entry.is_dir(follow_symlinks=False):
+                node_children: List[Dict] = []
+                children.append(
+                    {
+                        'name': entry.name,
+                        'path': node_path,
+                        'type': 'directory',
+                        'children': node_children
+                    }
+                )
+                stack.append((iter(scan_sorted(entry.path)), node_path + '/', node_children))
+                break
+            elif entry.is_file(follow_symlinks=False):
+                pending.append((entry.path, node_path, entry.stat(follow_symlinks=False).st_size))
+                children.append({'name': entry.name, 'path': node_path, 'type': 'file'})
+        else:
+            stack.pop()
+
+    return tree_nodes
+
+
+async def iter_file_records(pending: List[tuple[str, str, int]]) -> AsyncIterator[FileRecord]:
+    loop = asyncio.get_running_loop()
+    window: Deque[asyncio.Future[FileRecord]] = deque()
+    try:
+        for item in pending:
+            window.append(loop.run_in_executor(read_executor, read_file_record, *item))
+            if len(window) >= READ_CONCURRENCY:
+                yield await window.popleft()
+        while window:
+            yield await window.popleft()
+    finally:
+        for future in window:
+            future.cancel()
+
+
+async def iter_parse_events(tree: List[Dict], pending: List[tuple[str, str, int]]) -> AsyncIterator[Dict]:
+    yield {'type': 'tree', 'tree': tree}
+    async for record in iter_file_records(pending):
+        yield {'type': 'file', 'file': record}
+
+
+async def stream_parse_events(
+    workspace: Path,
+    tree: List[Dict],
+    pending: List[tuple[str, str, int]],
+    cache_key: tuple[str, str] | None = None
+) -> AsyncIterator[bytes]:
+    cached_chunks: List[bytes] | None = [] if cache_key else None
+    cached_size = 0
+    try:
+        async for event in iter_parse_events(tree, pending):
+            chunk = orjson.dumps(event) + b'\n'
+            if cached_chunks is not None:
+                cached_size += len(chunk)
+                if cached_size > PARSE_CACHE_ENTRY_BYTES:
+                    cached_chunks = None
+                else:
+                    cached_chunks.append(chunk)
+            yield chunk
+        if cache_key and cached_chunks is not None:
+            parse_cache.put(cache_key, b''.join(cached_chunks))
+    finally:
+        asyncio.get_running_loop().run_in_executor(None, partial(shutil.rmtree, workspace, ignore_errors=True))
 
 
 class TokenRequest(BaseModel):
@@ -279,19 +432,68 @@ class TokenResponse(BaseModel):
     tokens: int
 
 
-def count_tokens(text: str, model: str | None) -> int:
+@lru_cache(maxsize=16)
+def get_encoding(model: str | None) -> tiktoken.Encoding:
     try:
-        encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
     except KeyError:
-        encoding = tiktoken.get_encoding('cl100k_base')
-    return len(encoding.encode(text))
+        return tiktoken.get_encoding('cl100k_base')
+
+
+# Chunks are counted independently, so a token spanning a seam is counted as two.
+# Seams prefer a newline, then other whitespace, and only fall back to a hard cut
+# (e.g. minified files), which keeps the estimate within a token or two per chunk.
+def split_text(text: str, chunk_chars: int) -> List[str]:
+    chunks: List[str] = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_chars
+        if end < len(text):
+            boundary = text.rfind('\n', start, end)
+            if boundary <= start:
+                boundary = max(text.rfind(' ', start, end), text.rfind('\t', start, end))
+            if boundary > start:
+                end = boundary + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def count_tokens(text: str, model: str | None) -> int:
+    encoding = get_encoding(model)
+    if len(text) <= TOKEN_CHUNK_CHARS:
+        return len(encoding.encode_ordinary(text))
+    batches = encoding.encode_ordinary_batch(
+        split_text(text, TOKEN_CHUNK_CHARS),
+        num_threads=TOKENIZER_THREADS
+    )
+    return sum(len(tokens) for tokens in batches)
+
+
+def sendfile_to_path(source_fd: int, offset: int, destination: Path, max_bytes: int) -> None:
+    if os.fstat(source_fd).st_size - offset > max_bytes:
+        raise HTTPException(status_code=413, detail='Zip exceeds allowed size')
+    with destination.open('wb') as writer:
+        while True:
+            sent = os.sendfile(writer.fileno(), source_fd, offset, UPLOAD_CHUNK_BYTES)
+            if sent == 0:
+                break
+            offset += sent
 
 
 async def stream_upload_to_file(upload: UploadFile, destination: Path, max_bytes: int) -> None:
+    if hasattr(os, 'sendfile') and getattr(upload.file, '_rolled', True):
+        try:
+            source_fd = upload.file.fileno()
+            await asyncio.to_thread(sendfile_to_path, source_fd, upload.file.tell(), destination, max_bytes)
+            return
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+
     size = 0
     with destination.open('wb') as writer:
         while True:
-            chunk = await upload.read(1024 * 1024)
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
             if not chunk:
                 break
             size += len(chunk)
@@ -300,22 +502,45 @@ async def stream_upload_to_file(upload: UploadFile, destination: Path, max_bytes
             writer.write(chunk)
 
 
-@app.post('/parse', response_model=ParsedResponse)
+@app.post(
+    '/parse',
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            'description': 'NDJSON stream: one tree event followed by one file event per file',
+            'content': {'application/x-ndjson': {}}
+        }
+    }
+)
 async def parse_repo(
     repoUrl: str | None = Form(None),
     zipFile: UploadFile | None = File(None)
-) -> ParsedResponse:
+) -> Response:
     if not repoUrl and not zipFile:
         raise HTTPException(status_code=422, detail='Provide either a repo URL or .zip file')
 
-    with tempfile.TemporaryDirectory() as workspace:
-        root_dir = Path(workspace) / 'project'
+    cache_key: tuple[str, str] | None = None
+    if zipFile is None and repoUrl:
+        try:
+            normalized_url = normalize_repo_url(repoUrl)
+            remote_head = await asyncio.to_thread(resolve_remote_head, normalized_url)
+        except subprocess.TimeoutExpired:
+            raise HTTPException(status_code=504, detail='Git remote timed out')
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        cached = parse_cache.get((normalized_url, remote_head)) if remote_head else None
+        if cached is not None:
+            return Response(cached, media_type='application/x-ndjson', headers={'X-Cache': 'HIT'})
+
+    workspace = Path(tempfile.mkdtemp())
+    try:
+        root_dir = workspace / 'project'
         root_dir.mkdir()
 
         if zipFile is not None:
             if not zipFile.filename.lower().endswith('.zip'):
                 raise HTTPException(status_code=400, detail='Upload a .zip archive')
-            temp_zip = Path(workspace) / 'upload.zip'
+            temp_zip = workspace / 'upload.zip'
             await stream_upload_to_file(zipFile, temp_zip, MAX_ZIP_BYTES)
             try:
                 safe_extract_zip(temp_zip, root_dir, MAX_EXTRACT_BYTES)
@@ -323,24 +548,40 @@ async def parse_repo(
                 raise HTTPException(status_code=400, detail=str(exc))
         elif repoUrl:
             try:
-                normalized_url = normalize_repo_url(repoUrl)
-                await asyncio.to_thread(clone_repository, normalized_url, root_dir)
+                cloned_head = await asyncio.to_thread(clone_repository, normalized_url, root_dir, workspace / 'git')
             except subprocess.TimeoutExpired:
                 raise HTTPException(status_code=504, detail='Git clone timed out')
             except ValueError as exc:
                 raise HTTPException(status_code=400, detail=str(exc))
+            if cloned_head:
+                cache_key = (normalized_url, cloned_head)
 
-        tree, files = await asyncio.to_thread(recursively_collect, root_dir, Path())
-        files_sorted = sorted(files, key=lambda record: record['path'])
+        pending: List[tuple[str, str, int]] = []
+        tree = await asyncio.to_thread(collect_tree, str(root_dir), pending)
+    except BaseException:
+        shutil.rmtree(workspace, ignore_errors=True)
+        raise
 
-        return ParsedResponse(files=files_sorted, tree=tree)
+    return StreamingResponse(
+        stream_parse_events(workspace, tree, pending, cache_key),
+        media_type='application/x-ndjson',
+        headers={'X-Cache': 'MISS'} if cache_key else None
+    )
 
 
 @app.post('/tokens', response_model=TokenResponse)
 async def tokens(payload: TokenRequest) -> TokenResponse:
     if len(payload.text) > MAX_TOKEN_TEXT_CHARS:
         raise HTTPException(status_code=413, detail='Text exceeds allowed size')
-    tokens_count = await asyncio.to_thread(count_tokens, payload.text, payload.model)
+    loop = asyncio.get_running_loop()
+    pool = app.state.cpu_pool
+    try:
+        tokens_count = await loop.run_in_executor(pool, count_tokens, payload.text, payload.model)
+    except BrokenProcessPool:
+        if app.state.cpu_pool is pool:
+            app.state.cpu_pool = create_cpu_pool()
+            pool.shutdown(wait=False, cancel_futures=True)
+        tokens_count = await asyncio.to_thread(count_tokens, payload.text, payload.model)
     return TokenResponse(tokens=tokens_count)
 
 
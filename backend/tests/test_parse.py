@@ -0,0 +1,231 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+import main
+from main import MAX_FILE_BYTES, ParseCache, app, safe_extract_zip
+
+
+def build_zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def parse_zip(members: dict):
+    client = TestClient(app)
+    return client.post(
+        '/parse',
+        files={'zipFile': ('repo.zip', build_zip(members), 'application/zip')}
+    )
+
+
+def spy_sendfile(monkeypatch) -> list:
+    calls = []
+    sendfile_to_path = main.sendfile_to_path
+
+    def spy(*args):
+        try:
+            sendfile_to_path(*args)
+        except Exception as exc:
+            calls.append(exc)
+            raise
+        calls.append(None)
+
+    monkeypatch.setattr(main, 'sendfile_to_path', spy)
+    return calls
+
+
+def read_events(response) -> tuple:
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]['type'] == 'tree'
+    assert all(event['type'] == 'file' for event in events[1:])
+    return events[0]['tree'], [event['file'] for event in events[1:]]
+
+
+def test_parse_zip_collects_tree_and_files():
+    response = parse_zip(
+        {
+            'README.md': '# hello\n',
+            '.github/ci.yml': 'on: push\n',
+            'src/app.py': 'print("hi")\n',
+            'src/logo.png': b'\x89PNG\x00\x00binary',
+            'src/big.txt': 'a' * (MAX_FILE_BYTES + 1),
+            'node_modules/lib/index.js': 'module.exports = {}\n'
+        }
+    )
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    tree, records = read_events(response)
+
+    assert tree == [
+        {
+            'name': '.github',
+            'path': '.github',
+            'type': 'directory',
+            'children': [{'name': 'ci.yml', 'path': '.github/ci.yml', 'type': 'file'}]
+        },
+        {'name': 'README.md', 'path': 'README.md', 'type': 'file'},
+        {
+            'name': 'src',
+            'path': 'src',
+            'type': 'directory',
+            'children': [
+                {'name': 'app.py', 'path': 'src/app.py', 'type': 'file'},
+                {'name': 'big.txt', 'path': 'src/big.txt', 'type': 'file'},
+                {'name': 'logo.png', 'path': 'src/logo.png', 'type': 'file'}
+            ]
+        }
+    ]
+
+    assert [record['path'] for record in records] == [
+        '.github/ci.yml',
+        'README.md',
+        'src/app.py',
+        'src/big.txt',
+        'src/logo.png'
+    ]
+    files = {record['path']: record for record in records}
+    assert files['src/app.py']['content'] == 'print("hi")\n'
+    assert files['src/app.py']['omitted'] is False
+    assert files['src/logo.png']['omittedReason'] == 'binary'
+    assert files['src/big.txt']['omittedReason'] == 'large'
+    assert files['src/big.txt']['size'] == MAX_FILE_BYTES + 1
+
+
+def test_parse_rejects_zip_path_traversal():
+    response = parse_zip({'../escape.txt': 'nope'})
+    assert response.status_code == 400
+
+
+def test_parse_large_upload_is_copied_with_sendfile(monkeypatch):
+    calls = spy_sendfile(monkeypatch)
+    members = {f'chunk{index}.txt': str(index) * 400_000 for index in range(4)}
+    response = parse_zip(members)
+    assert response.status_code == 200
+    assert calls == [None]
+    _, records = read_events(response)
+    assert [record['path'] for record in records] == sorted(members)
+    assert all(record['content'] == members[record['path']] for record in records)
+
+
+def test_parse_large_upload_over_limit_is_rejected_by_sendfile(monkeypatch):
+    calls = spy_sendfile(monkeypatch)
+    monkeypatch.setattr(main, 'MAX_ZIP_BYTES', 1024 * 1024)
+    response = parse_zip({'big.txt': 'a' * (2 * 1024 * 1024)})
+    assert response.status_code == 413
+    assert len(calls) == 1 and calls[0].status_code == 413
+
+
+def test_safe_extract_zip_skips_on_normalized_paths(tmp_path):
+    source = tmp_path / 'repo.zip'
+    source.write_bytes(build_zip({'node_modules/../c.txt': 'kept', 'src/node_modules/x.js': 'skipped'}))
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    safe_extract_zip(source, destination, 1024)
+    assert (destination / 'c.txt').read_text() == 'kept'
+    assert not (destination / 'src').exists()
+
+
+def test_safe_extract_zip_rejects_symlinks_in_skipped_dirs(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        link = zipfile.ZipInfo('node_modules/link')
+        link.external_attr = 0o120777 << 16
+        archive.writestr(link, '/etc/passwd')
+    source = tmp_path / 'repo.zip'
+    source.write_bytes(buffer.getvalue())
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    with pytest.raises(ValueError):
+        safe_extract_zip(source, destination, 1024)
+
+
+def test_safe_extract_zip_limits_decompressed_bytes(tmp_path):
+    source = tmp_path / 'bomb.zip'
+    source.write_bytes(build_zip({'a.txt': 'a' * 2048, 'b.txt': 'b' * 2048}))
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    with pytest.raises(ValueError):
+        safe_extract_zip(source, destination, 3000)
+
+
+def test_parse_cache_evicts_least_recently_used():
+    cache = ParseCache(max_bytes=10)
+    cache.put(('repo-a', 'sha'), b'aaaa')
+    cache.put(('repo-b', 'sha'), b'bbbb')
+    assert cache.get(('repo-a', 'sha')) == b'aaaa'
+    cache.put(('repo-c', 'sha'), b'cccc')
+    assert cache.get(('repo-b', 'sha')) is None
+    assert cache.get(('repo-a', 'sha')) == b'aaaa'
+    cache.put(('repo-d', 'sha'), b'x' * 11)
+    assert cache.get(('repo-d', 'sha')) is None
+    assert cache.size == 8
+
+
+def fake_clone(heads: dict):
+    def clone(repo_url, dest, git_dir):
+        (dest / 'README.md').write_text(f'# {heads["clone"]}\n')
+        return heads['clone']
+    return clone
+
+
+def test_parse_repo_url_serves_cache_hits(monkeypatch):
+    heads = {'remote': 'sha-1', 'clone': 'sha-1'}
+    monkeypatch.setattr(main, 'parse_cache', ParseCache(max_bytes=1024 * 1024))
+    monkeypatch.setattr(main, 'resolve_remote_head', lambda url: heads['remote'])
+    monkeypatch.setattr(main, 'clone_repository', fake_clone(heads))
+    client = TestClient(app)
+    data = {'repoUrl': 'https://github.com/owner/repo'}
+
+    first = client.post('/parse', data=data)
+    assert first.status_code == 200
+    assert first.headers['x-cache'] == 'MISS'
+
+    second = client.post('/parse', data=data)
+    assert second.headers['x-cache'] == 'HIT'
+    assert second.content == first.content
+
+    heads.update(remote='sha-2', clone='sha-2')
+    third = client.post('/parse', data=data)
+    assert third.headers['x-cache'] == 'MISS'
+    _, records = read_events(third)
+    assert records[0]['content'] == '# sha-2\n'
+
+
+def test_abandoned_parse_stream_is_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'parse_cache', ParseCache(max_bytes=1024 * 1024))
+    tree = [{'name': 'a.txt', 'path': 'a.txt', 'type': 'file'}]
+    key = ('https://github.com/owner/repo.git', 'sha')
+
+    async def consume(workspace, limit):
+        workspace.mkdir()
+        (workspace / 'a.txt').write_text('a\n')
+        pending = [(str(workspace / 'a.txt'), 'a.txt', 2)]
+        stream = main.stream_parse_events(workspace, tree, pending, key)
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            if len(chunks) == limit:
+                break
+        await stream.aclose()
+        return chunks
+
+    asyncio.run(consume(tmp_path / 'abandoned', 1))
+    assert main.parse_cache.get(key) is None
+
+    chunks = asyncio.run(consume(tmp_path / 'complete', None))
+    assert len(chunks) == 2
+    assert main.parse_cache.get(key) == b''.join(chunks)
+
+    main.parse_cache = ParseCache(max_bytes=1024 * 1024)
+    monkeypatch.setattr(main, 'PARSE_CACHE_ENTRY_BYTES', 10)
+    asyncio.run(consume(tmp_path / 'oversized', None))
+    assert main.parse_cache.get(key) is None
@@ -0,0 +1,87 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi.testclient import TestClient
+
+import main
+from main import app, split_text
+
+
+class BrokenPool:
+    def __init__(self) -> None:
+        self.shut_down = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool('worker died')
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        self.shut_down = True
+
+
+def test_tokens_recovers_from_broken_pool(monkeypatch):
+    monkeypatch.setattr(main, 'count_tokens', lambda text, model: len(text))
+    with TestClient(app) as client:
+        broken = BrokenPool()
+        app.state.cpu_pool.shutdown()
+        app.state.cpu_pool = broken
+        response = client.post('/tokens', json={'text': 'hello'})
+        assert response.status_code == 200
+        assert response.json() == {'tokens': 5}
+        assert broken.shut_down
+        assert app.state.cpu_pool is not broken
+
+
+def test_split_text_breaks_after_newlines():
+    text = 'alpha\nbeta gamma\ndelta\n' * 20
+    chunks = split_text(text, 16)
+    assert ''.join(chunks) == text
+    assert all(len(chunk) <= 16 for chunk in chunks)
+    assert all(chunk.endswith('\n') for chunk in chunks)
+
+
+def test_split_text_falls_back_to_spaces():
+    text = 'var a=1;var b=2; ' * 10
+    chunks = split_text(text, 20)
+    assert ''.join(chunks) == text
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert all(chunk.endswith(' ') for chunk in chunks)
+
+
+def test_split_text_hard_splits_without_whitespace():
+    text = 'x' * 50
+    chunks = split_text(text, 16)
+    assert ''.join(chunks) == text
+    assert [len(chunk) for chunk in chunks] == [16, 16, 16, 2]
+
+
+class FakeEncoding:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def encode_ordinary(self, text: str) -> list:
+        return text.split()
+
+    def encode_ordinary_batch(self, texts: list, *, num_threads: int) -> list:
+        self.batches.append(texts)
+        self.num_threads = num_threads
+        return [text.split() for text in texts]
+
+
+def test_count_tokens_batches_large_text(monkeypatch):
+    encoding = FakeEncoding()
+    monkeypatch.setattr(main, 'get_encoding', lambda model: encoding)
+    assert main.count_tokens('short text', None) == 2
+    assert encoding.batches == []
+
+    text = 'word ' * 20 + '\n'
+    large = text * (main.TOKEN_CHUNK_CHARS // len(text) + 10)
+    assert main.count_tokens(large, None) == len(large.split())
+    assert len(encoding.batches) == 1 and len(encoding.batches[0]) > 1
+
+
+def test_count_tokens_uses_all_cores_by_default(monkeypatch):
+    encoding = FakeEncoding()
+    monkeypatch.setattr(main, 'get_encoding', lambda model: encoding)
+    main.count_tokens('word\n' * main.TOKEN_CHUNK_CHARS, None)
+    assert main.CPU_POOL_WORKERS == 1
+    assert encoding.num_threads == (os.cpu_count() or 1)
@@ -34,6 +34,10 @@ type FileNode = {
   children?: FileNode[];
 };
 
+type ParseEvent =
+  | { type: "tree"; tree: FileNode[] }
+  | { type: "file"; file: FileRecord };
+
 type HighlightEntry = {
   content: string;
   html: string;
@@ -165,6 +169,26 @@ const highlightContent = (content: string, path: string) => {
   return { html: sanitizeHighlightedHtml(highlighted), language };
 };
 
+async function* readParseEvents(
+  body: ReadableStream<Uint8Array>,
+): AsyncGenerator<ParseEvent> {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    const lines = buffer.split("\n");
+    buffer = done ? "" : lines.pop() ?? "";
+    for (const line of lines) {
+      if (line.trim()) {
+        yield JSON.parse(line) as ParseEvent;
+      }
+    }
+    if (done) return;
+  }
+}
+
 type VirtualListProps<T> = {
   items: T[];
   itemHeight: number;
@@ -685,15 +709,23 @@ export default function Page() {
         throw new Error(text || "Failed to fetch files");
       }
 
-      const payload = (await response.json()) as {
-        files: FileRecord[];
-        tree: FileNode[];
-      };
-      setFiles(payload.files);
-      setTree(payload.tree);
+      if (!response.body) {
+        throw new Error("Failed to fetch files");
+      }
+
+      const parsedFiles: FileRecord[] = [];
+      for await (const parseEvent of readParseEvents(response.body)) {
+        if (parseEvent.type === "tree") {
+          setFiles([]);
+          setTree(parseEvent.tree);
+        } else {
+          parsedFiles.push(parseEvent.file);
+        }
+      }
+      setFiles(parsedFiles);
       highlightCacheRef.current.clear();
       const defaultIncluded = new Set<string>();
-      payload.files.forEach((file) => {
+      parsedFiles.forEach((file) => {
         if (
           !file.omitted &&
           file.size <= LARGE_FILE_THRESHOLD &&
@@ -707,7 +739,7 @@ export default function Page() {
       setCopyLabel("Copy All");
       setMessage({
         type: "info",
-        text: `Loaded ${payload.files.length} files.`,
+        text: `Loaded ${parsedFiles.length} files.`,
       });
       setBackendStatus("online");
     } catch (error) {